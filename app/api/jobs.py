@@ -1,11 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import boto3
 from botocore.exceptions import ClientError
 import uuid
-import json
 
+from app import sqs_batcher
 from app.database import get_db
 from app.config import get_settings
 from app.models import ProcessingJob, Video, JobStatus
@@ -15,15 +14,10 @@ router = APIRouter()
 settings = get_settings()
 
 
-def get_sqs_client():
-    return boto3.client('sqs', region_name=settings.aws_region)
-
-
 @router.post("/", response_model=JobCreateResponse, status_code=status.HTTP_201_CREATED)
 async def create_job(
     job_request: JobCreateRequest,
-    db: Session = Depends(get_db),
-    sqs_client = Depends(get_sqs_client)
+    db: Session = Depends(get_db)
 ):
     """Create a new video processing job and queue it"""
     
@@ -49,28 +43,27 @@ async def create_job(
         db.commit()
         db.refresh(job)
         
-        # Send message to SQS
+        # Send message to SQS (batched with other concurrent enqueues)
         message = {
             "job_id": job_id,
             "video_id": job_request.video_id,
             "s3_key": video.s3_key,
             "s3_bucket": settings.s3_bucket_name
         }
-        
-        sqs_client.send_message(
-            QueueUrl=settings.sqs_queue_url,
-            MessageBody=json.dumps(message),
-            MessageAttributes={
+
+        await sqs_batcher.enqueue(
+            message,
+            message_attributes={
                 'JobId': {
                     'StringValue': job_id,
                     'DataType': 'String'
                 }
             }
         )
-        
+
         return job
-        
-    except ClientError as e:
+
+    except (ClientError, RuntimeError) as e:
         db.rollback()
         # If SQS failed, mark job as failed
         try:
@@ -93,7 +86,7 @@ async def create_job(
 
 
 @router.get("/{job_id}", response_model=JobDetail)
-async def get_job(job_id: str, db: Session = Depends(get_db)):
+def get_job(job_id: str, db: Session = Depends(get_db)):
     """Get job details by ID"""
     
     job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
@@ -108,7 +101,7 @@ async def get_job(job_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=List[JobDetail])
-async def list_jobs(
+def list_jobs(
     video_id: Optional[str] = None,
     status_filter: Optional[JobStatus] = None,
     skip: int = 0,
@@ -135,7 +128,7 @@ async def list_jobs(
 
 
 @router.delete("/{job_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_job(job_id: str, db: Session = Depends(get_db)):
+def delete_job(job_id: str, db: Session = Depends(get_db)):
     """Delete a job record"""
     
     job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
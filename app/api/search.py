@@ -1,38 +1,23 @@
+import heapq
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+import orjson
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, text
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 import numpy as np
-import torch
-from transformers import CLIPTokenizer, CLIPModel
 
-from app.database import get_db
+from app import clip_service, search_index
+from app.clip_model import encode_text_query
+from app.database import SessionLocal, get_db
 from app.models import VideoFrame, Video
 from app.schemas import SearchRequest, SearchResult, SearchResponse
 from app.pinecone_client import query_similar_frames, get_index_stats
 
 router = APIRouter()
 
-# Load CLIP model for text encoding
-print("Loading CLIP model for search")
-model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-tokenizer = CLIPTokenizer.from_pretrained("openai/clip-vit-base-patch32")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model.to(device)
-model.eval()
-print(f"CLIP model loaded on {device}")
-
-
-def encode_text_query(query: str) -> np.ndarray:
-    inputs = tokenizer([query], padding=True, return_tensors="pt")
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-
-    with torch.no_grad():
-        text_features = model.get_text_features(**inputs)
-        text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-
-    return text_features.cpu().numpy()[0]
-
 
 def _build_pinecone_filter(video_ids: Optional[List[str]]) -> Optional[Dict[str, Any]]:
     if not video_ids:
@@ -40,6 +25,72 @@ def _build_pinecone_filter(video_ids: Optional[List[str]]) -> Optional[Dict[str,
     return {"video_id": {"$in": video_ids}}
 
 
+def _local_similarity_search(
+    db: Session,
+    query_embedding: np.ndarray,
+    threshold: float,
+    top_k: int,
+    video_ids: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Brute-force cosine search over the embeddings stored in Postgres.
+
+    Used as a fallback when Pinecone is unreachable. Scores come from a
+    single matmul against the cached pre-normalized embedding matrix
+    (see app.search_index) instead of a per-frame Python loop.
+    Returns matches in the same shape as query_similar_frames.
+    """
+    index = search_index.get_matrix(db)
+    if index is None:
+        return []
+
+    q = query_embedding / np.linalg.norm(query_embedding)
+
+    # HNSW top-k when faiss is installed and no per-video filter applies;
+    # otherwise brute-force matmul over the cached matrix
+    ann = None if video_ids else search_index.ann_search(index, q, top_k)
+    if ann is not None:
+        ids, scores = ann
+        keep = scores >= threshold
+        idx, sim_values = ids[keep], scores[keep]
+    else:
+        sims = search_index.score(index, q)
+
+        mask = sims >= threshold
+        if video_ids:
+            mask &= np.isin(index["video_id"], video_ids)
+
+        cand = np.where(mask)[0]
+        if len(cand) > top_k:
+            # Partial selection first: O(N) partition + O(K log K) sort
+            # instead of sorting every candidate
+            cand = cand[np.argpartition(-sims[cand], top_k)[:top_k]]
+        idx = cand[np.argsort(-sims[cand])]
+        sim_values = sims[idx]
+
+    # Vectorized mm:ss formatting for the selected frames in two divmod ops
+    # instead of per-match float arithmetic in the grouping loop
+    mins, secs = np.divmod(index["timestamp"][idx].astype(np.int32), 60)
+    time_formatted = [f"{m}:{s:02d}" for m, s in zip(mins, secs)]
+
+    matches = []
+    for j, (i, sim) in enumerate(zip(idx, sim_values)):
+        matches.append(
+            {
+                "frame_id": index["frame_id"][i],
+                "score": float(sim),
+                "metadata": {
+                    "video_id": index["video_id"][i],
+                    "video_filename": index["video_filename"][i],
+                    "frame_index": int(index["frame_index"][i]),
+                    "timestamp": float(index["timestamp"][i]),
+                    "time_formatted": time_formatted[j],
+                },
+            }
+        )
+    return matches
+
+
 @router.post("/", response_model=SearchResponse)
 async def search_videos(
     request: SearchRequest,
@@ -53,26 +104,56 @@ async def search_videos(
     print(f"  Max results per video: {request.max_results_per_video}")
     print(f"  Max videos: {request.max_videos}")
 
-    query_embedding = encode_text_query(request.query)
+    query_embedding = await clip_service.encode(request.query)
 
-    # Ask Pinecone for enough candidates to fill:
-    #   max_videos * max_results_per_video
+    # Ask Pinecone for exactly the number of candidates needed to fill
+    # max_videos * max_results_per_video; only over-fetch when the first
+    # page doesn't cover enough distinct videos.
     desired = request.max_videos * request.max_results_per_video
-    top_k = min(max(desired * 5, 50), 500)  # cap to keep latency sane
+    top_k = desired
 
     filter_dict = _build_pinecone_filter(request.video_ids)
 
+    # All of these are blocking (synchronous Pinecone client, DB queries,
+    # the in-memory matrix load); run them on the threadpool so a slow
+    # search doesn't stall every other request on the event loop
     try:
-        pinecone_matches = query_similar_frames(
+        pinecone_matches = await run_in_threadpool(
+            query_similar_frames,
             query_embedding=query_embedding,
             top_k=top_k,
             filter_dict=filter_dict,
         )
+
+        unique_videos = {(m.get("metadata") or {}).get("video_id") for m in pinecone_matches}
+        unique_videos.discard(None)
+        if len(pinecone_matches) == top_k and len(unique_videos) < request.max_videos:
+            top_k = min(top_k * 4, 500)  # cap to keep latency sane
+            pinecone_matches = await run_in_threadpool(
+                query_similar_frames,
+                query_embedding=query_embedding,
+                top_k=top_k,
+                filter_dict=filter_dict,
+            )
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Pinecone query failed: {str(e)}",
-        )
+        print(f"Pinecone query failed, falling back to local search: {e}")
+        try:
+            # One SQL call against the pgvector HNSW index
+            pinecone_matches = await run_in_threadpool(
+                search_index.query_similar_frames_pg,
+                db, query_embedding, top_k, request.video_ids,
+            )
+        except Exception as pg_error:
+            print(f"pgvector search unavailable ({pg_error}); using in-memory index")
+            db.rollback()
+            pinecone_matches = await run_in_threadpool(
+                _local_similarity_search,
+                db,
+                query_embedding,
+                request.threshold,
+                top_k,
+                request.video_ids,
+            )
 
     if not pinecone_matches:
         return SearchResponse(
@@ -83,55 +164,63 @@ async def search_videos(
             average_similarity=0.0,
         )
 
-    filtered = [m for m in pinecone_matches if float(m.get("score", 0.0)) >= request.threshold]
-
-    print(f"Pinecone returned {len(pinecone_matches)} matches; {len(filtered)} >= threshold")
+    # Single pass fusing the threshold filter with per-video grouping:
+    # each video keeps a bounded min-heap of its best max_results_per_video
+    # matches, so grouping works regardless of input sort order and worse
+    # matches are rejected with one comparison.
+    groups: Dict[str, List] = {}
+    filenames: Dict[str, str] = {}
+    kept = 0
+    for seq, m in enumerate(pinecone_matches):
+        score = float(m.get("score", 0.0))
+        if score < request.threshold:
+            continue
+        kept += 1
 
-    video_results: Dict[str, Dict[str, Any]] = {}
-    for m in filtered:
         md = m.get("metadata") or {}
         video_id = md.get("video_id")
-        video_filename = md.get("video_filename")
-
         if not video_id:
             continue
-        if video_id not in video_results:
-            video_results[video_id] = {
-                "video_id": video_id,
-                "video_filename": video_filename or "unknown",
-                "matches": [],
-            }
-
-        # early stop criteria
-        if len(video_results) >= request.max_videos and video_id not in video_results:
-            continue
-
-        if len(video_results[video_id]["matches"]) >= request.max_results_per_video:
-            continue
-
-        ts = float(md.get("timestamp", 0.0))
-        frame_index = int(md.get("frame_index", 0))
 
-        video_results[video_id]["matches"].append(
+        heap = groups.get(video_id)
+        if heap is None:
+            # Matches arrive sorted by score, so videos beyond the
+            # max_videos best ones can be skipped outright
+            if len(groups) >= request.max_videos:
+                continue
+            heap = groups[video_id] = []
+            filenames[video_id] = md.get("video_filename") or "unknown"
+
+        entry = (score, -seq, m, md)
+        if len(heap) < request.max_results_per_video:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heappushpop(heap, entry)
+
+    print(f"Pinecone returned {len(pinecone_matches)} matches; {kept} >= threshold")
+
+    results = []
+    for video_id, heap in groups.items():
+        matches = []
+        for score, _, m, md in sorted(heap, reverse=True):
+            ts = float(md.get("timestamp", 0.0))
+            matches.append(
+                {
+                    "frame_id": m.get("frame_id"),
+                    "frame_index": int(md.get("frame_index", 0)),
+                    "timestamp": ts,
+                    "time_formatted": md.get("time_formatted") or f"{int(ts // 60)}:{int(ts % 60):02d}",
+                    "similarity_score": score,
+                }
+            )
+        results.append(
             {
-                "frame_id": m.get("frame_id"),
-                "frame_index": frame_index,
-                "timestamp": ts,
-                "time_formatted": f"{int(ts // 60)}:{int(ts % 60):02d}",
-                "similarity_score": float(m.get("score", 0.0)),
+                "video_id": video_id,
+                "video_filename": filenames[video_id],
+                "matches": matches,
             }
         )
 
-        # If reached max_videos
-        if len(video_results) >= request.max_videos:
-            all_full = all(
-                len(v["matches"]) >= request.max_results_per_video for v in video_results.values()
-            )
-            if all_full:
-                break
-
-    results = list(video_results.values())[: request.max_videos]
-
     total_matches = sum(len(v["matches"]) for v in results)
     avg_score = (
         float(np.mean([m["similarity_score"] for v in results for m in v["matches"]]))
@@ -139,8 +228,6 @@ async def search_videos(
         else 0.0
     )
 
-    print(f"   Returning {len(results)} videos with {total_matches} total matches")
-    print(f"   Average similarity: {avg_score:.3f}\n")
     print(f"   Returning {len(results)} videos with {total_matches} total matches")
     print(f"   Average similarity: {avg_score:.3f}\n")
 
@@ -154,43 +241,71 @@ async def search_videos(
 
 
 @router.get("/videos/{video_id}/frames")
-async def get_video_frames(
+def get_video_frames(
     video_id: str,
     db: Session = Depends(get_db)
 ):
-    frames = (
-        db.query(VideoFrame)
+    frame_count = (
+        db.query(func.count(VideoFrame.id))
         .filter(VideoFrame.video_id == video_id)
-        .order_by(VideoFrame.timestamp)
-        .all()
+        .scalar()
     )
 
-    if not frames:
+    if not frame_count:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No frames found for video {video_id}"
         )
 
-    return {
-        "video_id": video_id,
-        "frame_count": len(frames),
-        "frames": [
-            {
-                "frame_id": frame.id,
-                "frame_index": frame.frame_index,
-                "timestamp": frame.timestamp,
-                "time_formatted": f"{int(frame.timestamp // 60)}:{int(frame.timestamp % 60):02d}"
-            }
-            for frame in frames
-        ]
-    }
+    def _gen():
+        # Stream the JSON array row-by-row so neither the ORM result nor the
+        # response body is ever fully materialized in memory
+        yield b'{"video_id":%s,"frame_count":%d,"frames":[' % (orjson.dumps(video_id), frame_count)
+
+        # The dependency-managed session is already closed by the time the
+        # body streams (yield dependencies tear down before the response on
+        # this FastAPI version), so the generator owns its own session
+        gen_db = SessionLocal()
+        try:
+            rows = gen_db.execute(
+                select(VideoFrame.id, VideoFrame.frame_index, VideoFrame.timestamp)
+                .where(VideoFrame.video_id == video_id)
+                .order_by(VideoFrame.timestamp)
+                .execution_options(yield_per=1000)
+            )
+            first = True
+            for frame in rows:
+                item = orjson.dumps(
+                    {
+                        "frame_id": frame.id,
+                        "frame_index": frame.frame_index,
+                        "timestamp": frame.timestamp,
+                        "time_formatted": f"{int(frame.timestamp // 60)}:{int(frame.timestamp % 60):02d}",
+                    }
+                )
+                yield item if first else b"," + item
+                first = False
+        finally:
+            gen_db.close()
+
+        yield b"]}"
+
+    return StreamingResponse(_gen(), media_type="application/json")
+
+
+@router.post("/cache/clear", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_query_cache():
+    """Flush cached text-query embeddings (e.g. after a model redeploy)"""
+    encode_text_query.cache_clear()
 
 
 @router.get("/stats")
-async def get_search_stats(db: Session = Depends(get_db)):
+def get_search_stats(db: Session = Depends(get_db)):
     """Get statistics about indexed videos"""
-    total_videos = db.query(func.count(Video.id)).scalar()
-    total_frames = db.query(func.count(VideoFrame.id)).scalar()
+    # Both counts in a single round trip
+    total_videos, total_frames = db.execute(
+        text("SELECT (SELECT count(*) FROM videos), (SELECT count(*) FROM video_frames)")
+    ).one()
 
     # Pinecone stats
     pinecone = {}
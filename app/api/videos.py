@@ -1,29 +1,68 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Depends, HTTPException, status, Query, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List
-import boto3
+from typing import List, Optional
+import aioboto3
+import asyncio
+import base64
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
-import json
+from datetime import datetime
+import orjson
+import time
 import uuid
 import os
-from sqlalchemy import func
+from sqlalchemy import func, text, tuple_
 
 from app.database import get_db
 from app.config import get_settings
-from app.models import Video, ProcessingJob, JobStatus
+from app.models import Video
 from app.schemas import VideoUploadResponse, VideoDetail
 from app.pinecone_client import delete_video_embeddings
+from app import search_index, sqs_batcher
 
 router = APIRouter()
 settings = get_settings()
 
 
-def get_s3_client():
-    return boto3.client('s3', region_name=settings.aws_region)
+_session = aioboto3.Session()
 
+# Shared long-lived clients: per-request client construction parses the full
+# botocore service model every time, and the default 10-connection pool
+# starves concurrent multipart uploads
+_boto_config = BotoConfig(
+    max_pool_connections=50,
+    retries={"max_attempts": 3, "mode": "adaptive"},
+)
+_clients = {}
+
+# Split uploads into 8 MB parts sent concurrently, so S3 transfer time
+# scales with bandwidth instead of round-trip latency
+_transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+)
+
+
+async def get_s3_client():
+    client = _clients.get("s3")
+    if client is None:
+        client = await _session.client(
+            's3', region_name=settings.aws_region, config=_boto_config
+        ).__aenter__()
+        _clients["s3"] = client
+    return client
+
+
+async def close_aws_clients():
+    """Close the shared clients. Called from FastAPI shutdown."""
+    for client in _clients.values():
+        await client.__aexit__(None, None, None)
+    _clients.clear()
 
-def get_sqs_client():
-    return boto3.client("sqs", region_name=settings.aws_region)
 
 
 def validate_video_file(file: UploadFile) -> None:
@@ -44,25 +83,32 @@ def validate_video_file(file: UploadFile) -> None:
         )
 
 
-def check_video_limit(db: Session):
-    """Check if maximum video limit is reached"""
-    video_count = db.query(func.count(Video.id)).scalar()
+# Conditional insert: the count check and the insert happen in the same
+# statement and round trip. The subquery still reads a statement-start
+# snapshot under READ COMMITTED, so it cannot see concurrent uncommitted
+# inserts by itself — _register_video takes a transaction-scoped advisory
+# lock first to serialize uploads through the cap check.
+_VIDEO_CAP_LOCK_KEY = 0x76696473  # arbitrary app-wide key ("vids")
+
+_LOCK_VIDEO_CAP = text("SELECT pg_advisory_xact_lock(:key)")
+
+_INSERT_VIDEO_IF_UNDER_LIMIT = text(
+    "INSERT INTO videos (id, filename, s3_key, size_bytes, format) "
+    "SELECT :id, :filename, :s3_key, :size_bytes, :format "
+    "WHERE (SELECT count(*) FROM videos) < :max_videos "
+    "RETURNING id, uploaded_at"
+)
 
-    if video_count >= settings.max_videos_limit:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=(
-                f"Maximum video limit reached ({settings.max_videos_limit} videos). "
-                f"Please delete some videos before uploading new ones."
-            ),
-        )
 
 @router.get("/stats/count", status_code=status.HTTP_200_OK)
-async def get_video_stats(db: Session = Depends(get_db)):
+def get_video_stats(db: Session = Depends(get_db)):
     """Get video statistics"""
-    
-    video_count = db.query(func.count(Video.id)).scalar()
-    total_size_bytes = db.query(func.sum(Video.size_bytes)).scalar() or 0
+
+    # Both aggregates in a single round trip
+    video_count, total_size_bytes = db.query(
+        func.count(Video.id),
+        func.coalesce(func.sum(Video.size_bytes), 0),
+    ).one()
     total_size_mb = total_size_bytes / (1024 * 1024)
     
     return {
@@ -80,30 +126,108 @@ async def get_video_play_url(
     db: Session = Depends(get_db),
     s3_client = Depends(get_s3_client),
 ):
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if not video:
+    # Single-column query: no ORM instance to hydrate for one attribute
+    s3_key = db.query(Video.s3_key).filter(Video.id == video_id).scalar()
+    if s3_key is None:
         raise HTTPException(status_code=404, detail="Video not found")
 
     try:
-        url = s3_client.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": settings.s3_bucket_name, "Key": video.s3_key},
-            ExpiresIn=expires_seconds,
-        )
+        url = await _presign_get(s3_client, s3_key, expires_seconds)
         return {"video_id": video_id, "url": url}
     except ClientError as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate play URL: {e}")
 
 
+# Presigned URLs for a hot video are identical within their expiry window;
+# bucketing by half the window keeps cached entries comfortably valid
+_presign_cache = {}
+
+
+async def _presign_get(s3_client, s3_key: str, expires_seconds: int) -> str:
+    epoch = int(time.time() // max(expires_seconds // 2, 1))
+    cache_key = (s3_key, expires_seconds, epoch)
+    url = _presign_cache.get(cache_key)
+    if url is None:
+        url = await s3_client.generate_presigned_url(
+            ClientMethod="get_object",
+            Params={"Bucket": settings.s3_bucket_name, "Key": s3_key},
+            ExpiresIn=expires_seconds,
+        )
+        if len(_presign_cache) > 4096:
+            _presign_cache.clear()
+        _presign_cache[cache_key] = url
+    return url
+
+
+async def _register_video(db, s3_client, video_id: str, filename: str,
+                          file_ext: str, s3_key: str, file_size: int) -> Video:
+    """Create the video row, auto-create a processing job, and queue it"""
+    # Serialize concurrent uploads through the cap check: the advisory
+    # lock is held until this transaction commits or rolls back, so each
+    # count subquery sees every earlier insert. Insert-if-under-cap: no
+    # row comes back when the limit is hit.
+    db.execute(_LOCK_VIDEO_CAP, {"key": _VIDEO_CAP_LOCK_KEY})
+    row = db.execute(
+        _INSERT_VIDEO_IF_UNDER_LIMIT,
+        {
+            "id": video_id,
+            "filename": filename,
+            "s3_key": s3_key,
+            "size_bytes": file_size,
+            "format": file_ext,
+            "max_videos": settings.max_videos_limit,
+        },
+    ).first()
+    if row is None:
+        db.rollback()
+        # The object is already in S3; clean it up before rejecting
+        await s3_client.delete_object(Bucket=settings.s3_bucket_name, Key=s3_key)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Maximum video limit reached ({settings.max_videos_limit} videos). "
+                f"Please delete some videos before uploading new ones."
+            ),
+        )
+
+    db.commit()
+
+    # The job row is created by the worker on message receipt (idempotent
+    # ON CONFLICT insert); only the video row costs a commit here, and a
+    # failed SQS send no longer strands a committed pending job
+    job_id = str(uuid.uuid4())
+
+    video = Video(
+        id=video_id,
+        filename=filename,
+        s3_key=s3_key,
+        size_bytes=file_size,
+        format=file_ext,
+        uploaded_at=row.uploaded_at,
+    )
+
+    message = {
+        "job_id": job_id,
+        "video_id": video_id,
+        "s3_key": s3_key,
+        "s3_bucket": settings.s3_bucket_name
+    }
+    # Batched with other concurrent enqueues (up to 10 per SQS call)
+    await sqs_batcher.enqueue(
+        message,
+        message_attributes={"JobId": {"StringValue": job_id, "DataType": "String"}}
+    )
+
+    return video
+
+
 @router.post("/upload", response_model=VideoUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_video(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    s3_client  = Depends(get_s3_client),
-    sqs_client = Depends(get_sqs_client)
+    s3_client  = Depends(get_s3_client)
 ):
     """Upload a video file to S3 and register it in the database"""
-    check_video_limit(db)
     validate_video_file(file)
     
     # Generate unique ID and S3 key
@@ -112,56 +236,34 @@ async def upload_video(
     s3_key = f"videos/{video_id}.{file_ext}"
     
     try:
-        # Upload to S3
-        file_content = await file.read()
-        file_size = len(file_content)
-        
-        s3_client.put_object(
-            Bucket=settings.s3_bucket_name,
-            Key=s3_key,
-            Body=file_content,
-            ContentType=file.content_type or 'video/mp4'
-        )
-        
-        # Create database record
-        video = Video(
-            id=video_id,
-            filename=file.filename,
-            s3_key=s3_key,
-            size_bytes=file_size,
-            format=file_ext
-        )
-        
-        db.add(video)
-        db.commit()
-        db.refresh(video)
-
-        # auto-create a job
-        job_id = str(uuid.uuid4())
-        job = ProcessingJob(
-            id=job_id,
-            video_id=video_id,
-            status=JobStatus.PENDING
+        # Stream to S3 in chunks instead of buffering the whole file in RAM
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
+        file.file.seek(0)
+
+        # The spooled upload is complete at this point, so the size cap can
+        # be enforced before a single byte goes to S3
+        if file_size > settings.max_video_size_mb * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large. Max size: {settings.max_video_size_mb}MB"
+            )
+
+        await s3_client.upload_fileobj(
+            file.file,
+            settings.s3_bucket_name,
+            s3_key,
+            ExtraArgs={'ContentType': file.content_type or 'video/mp4'},
+            Config=_transfer_config
         )
-        db.add(job)
-        db.commit()
-        db.refresh(job)
-
-        # Send message to SQS
-        message = {
-            "job_id": job_id,
-            "video_id": video_id,
-            "s3_key": video.s3_key,
-            "s3_bucket": settings.s3_bucket_name
-        }
-        sqs_client.send_message(
-            QueueUrl=settings.sqs_queue_url,
-            MessageBody=json.dumps(message),
-            MessageAttributes={"JobId": {"StringValue": job_id, "DataType": "String"}}
+
+        return await _register_video(
+            db, s3_client, video_id, file.filename, file_ext, s3_key, file_size
         )
-        
-        return video
-        
+
+    except HTTPException:
+        db.rollback()
+        raise
     except ClientError as e:
         db.rollback()
         raise HTTPException(
@@ -176,27 +278,181 @@ async def upload_video(
         )
             
             
-@router.get("/", response_model=List[VideoDetail])
-async def list_videos(
+@router.post("/upload/stream", response_model=VideoUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_video_stream(
+    request: Request,
+    filename: str = Query(..., description="Original filename, including extension"),
+    db: Session = Depends(get_db),
+    s3_client  = Depends(get_s3_client)
+):
+    """
+    Upload a video by streaming the raw request body straight to S3.
+
+    Unlike /upload, the body is never spooled to disk first: 8 MB parts go
+    to S3 while the client is still sending, so request time is roughly
+    max(client->server, server->S3) instead of their sum. The size cap is
+    enforced incrementally, failing fast on the first byte past the limit.
+    """
+    file_ext = filename.split('.')[-1].lower()
+    if file_ext not in settings.supported_formats:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format. Supported: {', '.join(settings.supported_formats)}"
+        )
+
+    video_id = str(uuid.uuid4())
+    s3_key = f"videos/{video_id}.{file_ext}"
+    content_type = request.headers.get("content-type") or "video/mp4"
+    max_bytes = settings.max_video_size_mb * 1024 * 1024
+    part_size = 8 * 1024 * 1024
+
+    mpu = await s3_client.create_multipart_upload(
+        Bucket=settings.s3_bucket_name,
+        Key=s3_key,
+        ContentType=content_type
+    )
+    upload_id = mpu["UploadId"]
+
+    # At most 8 parts in flight; the semaphore also bounds buffered bytes
+    semaphore = asyncio.Semaphore(8)
+    tasks = []
+    part_number = 0
+
+    async def _send_part(number: int, data: bytes):
+        try:
+            part = await s3_client.upload_part(
+                Bucket=settings.s3_bucket_name,
+                Key=s3_key,
+                PartNumber=number,
+                UploadId=upload_id,
+                Body=data
+            )
+            return {"ETag": part["ETag"], "PartNumber": number}
+        finally:
+            semaphore.release()
+
+    try:
+        buffer = bytearray()
+        total_bytes = 0
+
+        async for chunk in request.stream():
+            total_bytes += len(chunk)
+            if total_bytes > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File too large. Max size: {settings.max_video_size_mb}MB"
+                )
+            buffer.extend(chunk)
+
+            while len(buffer) >= part_size:
+                data = bytes(buffer[:part_size])
+                del buffer[:part_size]
+                await semaphore.acquire()
+                part_number += 1
+                tasks.append(asyncio.create_task(_send_part(part_number, data)))
+
+        if buffer or not tasks:
+            await semaphore.acquire()
+            part_number += 1
+            tasks.append(asyncio.create_task(_send_part(part_number, bytes(buffer))))
+
+        parts = await asyncio.gather(*tasks)
+
+        await s3_client.complete_multipart_upload(
+            Bucket=settings.s3_bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts}
+        )
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        await s3_client.abort_multipart_upload(
+            Bucket=settings.s3_bucket_name,
+            Key=s3_key,
+            UploadId=upload_id
+        )
+        raise
+
+    try:
+        return await _register_video(
+            db, s3_client, video_id, filename, file_ext, s3_key, total_bytes
+        )
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Upload failed: {str(e)}"
+        )
+
+
+def _encode_cursor(video: Video) -> str:
+    raw = orjson.dumps([video.uploaded_at.isoformat(), video.id])
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        uploaded_at, video_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(uploaded_at), video_id
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+# Compiled once: validates and serializes the whole page in single calls
+# into pydantic-core instead of a per-object model round trip
+_VIDEO_LIST_ADAPTER = TypeAdapter(List[VideoDetail])
+
+_VIDEO_COLUMNS = (
+    Video.id, Video.filename, Video.s3_key, Video.size_bytes,
+    Video.duration_seconds, Video.format, Video.uploaded_at,
+)
+
+
+# response_model=None: the TypeAdapter already validated the payload, so
+# FastAPI shouldn't re-validate item by item
+@router.get("/", response_model=None, responses={200: {"model": List[VideoDetail]}})
+def list_videos(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Keyset cursor from X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
-    """List all videos with pagination"""    
-    return (
-        db.query(Video)
-        .order_by(Video.uploaded_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    """List all videos with pagination"""
+    # Keyset (seek) pagination: the cursor pins the scan to the composite
+    # (uploaded_at, id) index, so deep pages cost the same as page one.
+    # The offset path stays for clients that still send skip.
+    # Column tuples skip ORM instance hydration entirely.
+    query = db.query(*_VIDEO_COLUMNS).order_by(Video.uploaded_at.desc(), Video.id.desc())
+    if cursor is not None:
+        query = query.filter(tuple_(Video.uploaded_at, Video.id) < _decode_cursor(cursor))
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.limit(limit).all()
+
+    headers = {}
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+
+    payload = _VIDEO_LIST_ADAPTER.dump_python(
+        _VIDEO_LIST_ADAPTER.validate_python(rows, from_attributes=True),
+        mode="json",
     )
+    return ORJSONResponse(payload, headers=headers)
 
 
 @router.get("/{video_id}", response_model=VideoDetail)
-async def get_video(video_id: str, db: Session = Depends(get_db)):
+def get_video(video_id: str, db: Session = Depends(get_db)):
     """Get video details by ID"""
     
-    video = db.query(Video).filter(Video.id == video_id).first()
+    video = db.get(Video, video_id)
     
     if not video:
         raise HTTPException(
@@ -207,14 +463,39 @@ async def get_video(video_id: str, db: Session = Depends(get_db)):
     return video
 
 
+async def _cleanup_remote(s3_client, video_id: str, s3_key: str):
+    """
+    Remove the Pinecone embeddings and S3 object for a deleted video.
+
+    Runs as a background task after the DB row is gone; the database is
+    the source of truth, so failures are logged rather than surfaced.
+    """
+    for attempt in range(3):
+        try:
+            delete_video_embeddings(video_id)
+            break
+        except Exception as e:
+            print(f"Pinecone cleanup for video {video_id} failed (attempt {attempt + 1}): {e}")
+            await asyncio.sleep(2 ** attempt)
+
+    for attempt in range(3):
+        try:
+            await s3_client.delete_object(Bucket=settings.s3_bucket_name, Key=s3_key)
+            break
+        except ClientError as e:
+            print(f"S3 cleanup for {s3_key} failed (attempt {attempt + 1}): {e}")
+            await asyncio.sleep(2 ** attempt)
+
+
 @router.delete("/{video_id}", status_code=status.HTTP_200_OK)
 async def delete_video(
     video_id: str,
+    background: BackgroundTasks,
     db: Session = Depends(get_db),
     s3_client = Depends(get_s3_client)
 ):
     """Delete a video from S3 and database"""
-    video = db.query(Video).filter(Video.id == video_id).first()
+    video = db.get(Video, video_id)
     if not video:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -225,35 +506,20 @@ async def delete_video(
     s3_key = video.s3_key
 
     try:
-        #Delete embeddings from Pinecone
-        try:
-            delete_video_embeddings(video_id)
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to delete Pinecone embeddings for video {video_id}: {str(e)}",
-            )
-
-        #Delete associated jobs
-        db.query(ProcessingJob).filter(ProcessingJob.video_id == video_id).delete()
-
-        # Delete from S3
-        try:
-            s3_client.delete_object(
-                Bucket=settings.s3_bucket_name,
-                Key=video.s3_key
-            )
-        except ClientError:
-            # continue with database deletion
-            pass
-        
-        # Delete from database
+        # Delete from database first (jobs go with it via ON DELETE
+        # CASCADE) and answer in one DB round trip; the external stores
+        # are cleaned up off the request path
         db.delete(video)
         db.commit()
-        
+
+        # Cached matrices no longer match the DB
+        search_index.invalidate()
+
+        background.add_task(_cleanup_remote, s3_client, video_id, s3_key)
+
         return {
             "status": "success",
-            "message": f"Video '{video.filename}' deleted successfully"
+            "message": f"Video '{filename}' deleted successfully"
         }
 
     except Exception as e:
@@ -0,0 +1,40 @@
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import CLIPTokenizer, CLIPModel
+
+# Singleton CLIP text encoder shared by every module in the API process.
+# Loading the model costs seconds and ~500MB of RAM, so it must only
+# happen once regardless of how many routers import it.
+print("Loading CLIP model for search")
+model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+tokenizer = CLIPTokenizer.from_pretrained("openai/clip-vit-base-patch32")
+device = "cuda" if torch.cuda.is_available() else "cpu"
+model.to(device)
+if device == "cuda":
+    # FP16 halves activation bandwidth and uses tensor cores for text encoding
+    model = model.half()
+model.eval()
+print(f"CLIP model loaded on {device}")
+
+
+def encode_text_batch(queries: List[str]) -> np.ndarray:
+    inputs = tokenizer(queries, padding=True, return_tensors="pt")
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+
+    with torch.inference_mode():
+        text_features = model.get_text_features(**inputs)
+        text_features = F.normalize(text_features, dim=-1)
+
+    return text_features.float().cpu().numpy()
+
+
+@lru_cache(maxsize=1024)
+def encode_text_query(query: str) -> np.ndarray:
+    # Text encoding is the most expensive per-request step and the same
+    # query string is often re-issued (pagination, retries), so cache by
+    # raw query text. Callers must not mutate the returned array.
+    return encode_text_batch([query])[0]
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+from app.clip_model import encode_text_batch, encode_text_query
+
+# Queries arriving within this window share one padded forward pass
+MAX_BATCH = 32
+BATCH_WINDOW_SECONDS = 0.01
+
+_queue: Optional[asyncio.Queue] = None
+_batch_task: Optional[asyncio.Task] = None
+
+
+async def start() -> None:
+    """Start the batching loop. Called from FastAPI startup."""
+    global _queue, _batch_task
+    if _batch_task is None:
+        _queue = asyncio.Queue()
+        _batch_task = asyncio.create_task(_batch_loop())
+
+
+async def stop() -> None:
+    """Stop the batching loop. Called from FastAPI shutdown."""
+    global _queue, _batch_task
+    if _batch_task is not None:
+        _batch_task.cancel()
+        try:
+            await _batch_task
+        except asyncio.CancelledError:
+            pass
+        _batch_task = None
+        _queue = None
+
+
+async def encode(query: str) -> np.ndarray:
+    """
+    Encode a text query, coalescing concurrent queries into one padded
+    forward pass. Falls back to the direct cached path when the batching
+    loop isn't running (e.g. outside the FastAPI event loop).
+    """
+    if _queue is None:
+        return encode_text_query(query)
+
+    future = asyncio.get_running_loop().create_future()
+    await _queue.put((query, future))
+    return await future
+
+
+async def _batch_loop() -> None:
+    while True:
+        batch = [await _queue.get()]
+
+        deadline = asyncio.get_running_loop().time() + BATCH_WINDOW_SECONDS
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            loop = asyncio.get_running_loop()
+            if len(batch) == 1:
+                # Single query: go through the per-query cache
+                embedding = await loop.run_in_executor(None, encode_text_query, batch[0][0])
+                embeddings = [embedding]
+            else:
+                embeddings = await loop.run_in_executor(
+                    None, encode_text_batch, [query for query, _ in batch]
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
@@ -22,6 +22,11 @@ class Settings(BaseSettings):
     # pinecone
     pinecone_api_key: str
     pinecone_index_name: str = "video-frames"
+    # Only enable for indexes created with an int8 vector type
+    pinecone_int8: bool = False
+
+    # Search
+    search_index_int8: bool = False
 
     # Processing
     max_video_size_mb: int = 500
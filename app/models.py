@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, DateTime, Float, JSON, Enum as SQLEnum, ForeignKey, ARRAY
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, String, Integer, DateTime, Float, JSON, Enum as SQLEnum, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -14,7 +15,13 @@ class JobStatus(str, enum.Enum):
 
 class Video(Base):
     __tablename__ = "videos"
-    
+
+    # Composite index backing keyset pagination on (uploaded_at, id);
+    # Postgres scans it backwards for the DESC, DESC ordering
+    __table_args__ = (
+        Index("idx_videos_uploaded_id", "uploaded_at", "id"),
+    )
+
     id = Column(String, primary_key=True, index=True)
     filename = Column(String, nullable=False)
     s3_key = Column(String, nullable=False, unique=True)
@@ -32,13 +39,26 @@ class Video(Base):
 class VideoFrame(Base):
     __tablename__ = "video_frames"
 
+    # ANN index so in-DB similarity queries don't scan every row; the
+    # unique constraint is the conflict target for idempotent reprocessing
+    __table_args__ = (
+        Index(
+            "idx_video_frames_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        UniqueConstraint("video_id", "frame_index", name="uq_video_frames_video_frame"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     video_id = Column(String, ForeignKey('videos.id'), nullable=False, index=True)
     frame_index = Column(Integer, nullable=False)
     timestamp = Column(Float, nullable=False, index=True)
 
-    # CLIP embedding as array (512 dimensions for CLIP ViT-B/32)
-    embedding = Column(ARRAY(Float, dimensions=1), nullable=False)
+    # CLIP embedding (512 dimensions for CLIP ViT-B/32) as fixed-width
+    # pgvector storage: float4, no per-element text parsing on read
+    embedding = Column(Vector(512), nullable=False)
     scene_description = Column(String, nullable=True)
     video = relationship("Video", back_populates="frames")
 
@@ -48,9 +68,19 @@ class VideoFrame(Base):
 
 class ProcessingJob(Base):
     __tablename__ = "processing_jobs"
-    
+
+    # Composite indexes matching the list_jobs filter + ORDER BY created_at
+    # DESC paths (Postgres scans these backwards for the DESC ordering)
+    __table_args__ = (
+        Index("idx_jobs_video_status_created", "video_id", "status", "created_at"),
+        Index("idx_jobs_status_created", "status", "created_at"),
+    )
+
+
     id = Column(String, primary_key=True, index=True)
-    video_id = Column(String, nullable=False, index=True)
+    # ON DELETE CASCADE: deleting a video removes its jobs in the same
+    # statement, so delete_video needs no separate DELETE on this table
+    video_id = Column(String, ForeignKey('videos.id', ondelete='CASCADE'), nullable=False, index=True)
     status = Column(SQLEnum(JobStatus), default=JobStatus.PENDING, nullable=False, index=True)
     
     started_at = Column(DateTime(timezone=True), nullable=True)
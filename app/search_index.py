@@ -0,0 +1,176 @@
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+import torch
+from sqlalchemy.orm import Session
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+from app.config import get_settings
+from app.models import Video, VideoFrame
+
+settings = get_settings()
+
+# Process-level cache of frame embeddings for local similarity search.
+# The matrix is loaded once, pre-normalized, and reused across requests;
+# callers bump the version counter when frames are inserted or deleted.
+_device = "cuda" if torch.cuda.is_available() else "cpu"
+
+_lock = threading.Lock()
+_version = 0
+_loaded_version = -1
+_index: Optional[Dict[str, Any]] = None
+
+
+def invalidate() -> None:
+    """Mark the cached matrix stale. Call after inserting or deleting frames."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def get_matrix(db: Session) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached embedding matrix plus parallel metadata arrays.
+
+    Lazily loads every row from video_frames on first use (or after
+    invalidate()), stacks the embeddings into a single contiguous
+    pre-normalized float32 matrix, and keeps parallel arrays for
+    frame_id, video_id, frame_index, timestamp and video filename so a
+    search is one matmul plus array indexing -- no per-request DB join
+    or per-frame list conversion.
+
+    Returns None when no frames are indexed.
+    """
+    global _index, _loaded_version
+
+    with _lock:
+        if _loaded_version == _version:
+            return _index
+
+        rows = (
+            db.query(
+                VideoFrame.id,
+                VideoFrame.video_id,
+                VideoFrame.frame_index,
+                VideoFrame.timestamp,
+                VideoFrame.embedding,
+                Video.filename,
+            )
+            .join(Video, VideoFrame.video_id == Video.id)
+            .all()
+        )
+
+        if not rows:
+            _index = None
+            _loaded_version = _version
+            return None
+
+        matrix = np.ascontiguousarray([r.embedding for r in rows], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        _index = {
+            "frame_id": [f"{r.video_id}_frame_{r.frame_index}" for r in rows],
+            "video_id": np.asarray([r.video_id for r in rows], dtype=object),
+            "frame_index": np.asarray([r.frame_index for r in rows], dtype=np.int32),
+            "timestamp": np.asarray([r.timestamp for r in rows], dtype=np.float32),
+            "video_filename": [r.filename for r in rows],
+        }
+        if settings.search_index_int8:
+            # Symmetric per-row int8 quantization: 4x smaller resident
+            # matrix; scores are rescaled at query time
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            _index["matrix_int8"] = np.round(matrix / scales[:, None]).astype(np.int8)
+            _index["scales"] = scales.astype(np.float32)
+        else:
+            _index["matrix"] = matrix
+            if _device == "cuda":
+                # Keep a persistent half-precision copy on the GPU so scoring
+                # is a single tensor-core matmul instead of a NumPy GEMV on CPU
+                _index["matrix_gpu"] = torch.from_numpy(matrix).to(_device).half()
+            elif faiss is not None:
+                # Sublinear top-k on CPU; rows are normalized so inner
+                # product equals cosine similarity
+                hnsw = faiss.IndexHNSWFlat(matrix.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+                hnsw.add(matrix)
+                _index["faiss"] = hnsw
+        _loaded_version = _version
+        return _index
+
+
+def score(index: Dict[str, Any], query_embedding: np.ndarray) -> np.ndarray:
+    """
+    Cosine scores for a normalized query against the cached matrix.
+
+    Uses the resident GPU tensor when CUDA is available; only the (N,)
+    score vector crosses back over PCIe.
+    """
+    if "matrix_gpu" in index:
+        q = torch.from_numpy(np.ascontiguousarray(query_embedding)).to(_device).half()
+        return (index["matrix_gpu"] @ q).float().cpu().numpy()
+    if "matrix_int8" in index:
+        q_scale = np.abs(query_embedding).max() / 127.0
+        q8 = np.round(query_embedding / q_scale).astype(np.int32)
+        sims = index["matrix_int8"].astype(np.int32) @ q8
+        return sims.astype(np.float32) * (index["scales"] * np.float32(q_scale))
+    return index["matrix"] @ query_embedding
+
+
+def query_similar_frames_pg(
+    db: Session,
+    query_embedding: np.ndarray,
+    top_k: int,
+    video_ids=None,
+):
+    """
+    Cosine top-k served by the pgvector HNSW index in a single SQL call.
+
+    Alternative to the in-memory matrix for datasets too large to keep
+    resident; returns matches in the same shape as query_similar_frames.
+    """
+    distance = VideoFrame.embedding.cosine_distance(query_embedding.tolist())
+
+    query = (
+        db.query(
+            VideoFrame.video_id,
+            VideoFrame.frame_index,
+            VideoFrame.timestamp,
+            Video.filename,
+            (1 - distance).label("score"),
+        )
+        .join(Video, VideoFrame.video_id == Video.id)
+    )
+    if video_ids:
+        query = query.filter(VideoFrame.video_id.in_(video_ids))
+    rows = query.order_by(distance).limit(top_k).all()
+
+    return [
+        {
+            "frame_id": f"{r.video_id}_frame_{r.frame_index}",
+            "score": float(r.score),
+            "metadata": {
+                "video_id": r.video_id,
+                "video_filename": r.filename,
+                "frame_index": r.frame_index,
+                "timestamp": float(r.timestamp),
+            },
+        }
+        for r in rows
+    ]
+
+
+def ann_search(index: Dict[str, Any], query_embedding: np.ndarray, k: int):
+    """
+    Top-k row indices and scores from the HNSW index, or None when faiss
+    isn't installed (callers fall back to the brute-force matmul).
+    """
+    if "faiss" not in index:
+        return None
+    q = np.ascontiguousarray(query_embedding[None, :], dtype=np.float32)
+    scores, ids = index["faiss"].search(q, min(k, index["faiss"].ntotal))
+    keep = ids[0] >= 0
+    return ids[0][keep], scores[0][keep]
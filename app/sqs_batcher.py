@@ -0,0 +1,112 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+import boto3
+import orjson
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# SQS caps send_message_batch at 10 entries
+MAX_BATCH = 10
+# How long to wait for a batch to fill before flushing anyway
+FLUSH_INTERVAL_SECONDS = 0.05
+
+_sqs = boto3.client('sqs', region_name=settings.aws_region)
+
+_queue: Optional[asyncio.Queue] = None
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def start() -> None:
+    """Start the background flusher. Called from FastAPI startup."""
+    global _queue, _flush_task
+    if _flush_task is None:
+        _queue = asyncio.Queue()
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop() -> None:
+    """Stop the background flusher. Called from FastAPI shutdown."""
+    global _queue, _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+        _queue = None
+
+
+async def enqueue(message: Dict[str, Any], message_attributes: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Queue a message for batched delivery and wait until its batch flushed.
+
+    Messages from concurrent requests are coalesced into a single
+    send_message_batch call (up to 10 per flush), amortizing the per-call
+    SQS round trip. Raises if SQS rejected this message's batch entry.
+    """
+    if _queue is None:
+        raise RuntimeError("SQS batcher not started")
+
+    future = asyncio.get_running_loop().create_future()
+    await _queue.put((message, message_attributes, future))
+    await future
+
+
+async def _flush_loop() -> None:
+    while True:
+        batch = [await _queue.get()]
+
+        # Drain whatever else arrives within the flush window, up to the
+        # SQS batch limit
+        deadline = asyncio.get_running_loop().time() + FLUSH_INTERVAL_SECONDS
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        await _flush(batch)
+
+
+async def _flush(batch) -> None:
+    entries = []
+    for i, (message, attributes, _) in enumerate(batch):
+        entry = {
+            "Id": str(i),
+            "MessageBody": orjson.dumps(message).decode(),
+        }
+        if attributes:
+            entry["MessageAttributes"] = attributes
+        entries.append(entry)
+
+    try:
+        response = await run_in_threadpool(
+            _sqs.send_message_batch,
+            QueueUrl=settings.sqs_queue_url,
+            Entries=entries,
+        )
+    except Exception as e:
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    failed = {f["Id"]: f for f in response.get("Failed", [])}
+    for i, (_, _, future) in enumerate(batch):
+        if future.done():
+            continue
+        failure = failed.get(str(i))
+        if failure:
+            future.set_exception(
+                RuntimeError(f"SQS batch entry failed: {failure.get('Code')}: {failure.get('Message')}")
+            )
+        else:
+            future.set_result(None)
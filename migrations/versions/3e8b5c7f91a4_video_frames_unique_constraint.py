@@ -0,0 +1,25 @@
+"""unique (video_id, frame_index) on video_frames
+
+Revision ID: 3e8b5c7f91a4
+Revises: b6f03d2e58c1
+Create Date: 2026-09-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "3e8b5c7f91a4"
+down_revision = "b6f03d2e58c1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint(
+        "uq_video_frames_video_frame", "video_frames", ["video_id", "frame_index"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_video_frames_video_frame", "video_frames")
@@ -0,0 +1,101 @@
+"""initial schema
+
+Revision ID: 7c1d40a9b3f2
+Revises:
+Create Date: 2026-09-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+# revision identifiers, used by Alembic.
+revision = "7c1d40a9b3f2"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    # Databases that predate alembic were created by import-time
+    # create_all and already have these tables (with an older shape:
+    # ARRAY embedding column, no cascade FK, none of the new indexes).
+    # Skip creation here; the align-legacy-schema revision brings them
+    # up to date.
+    if sa.inspect(op.get_bind()).has_table("videos"):
+        return
+
+    op.create_table(
+        "videos",
+        sa.Column("id", sa.String(), primary_key=True, index=True),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("s3_key", sa.String(), nullable=False, unique=True),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("duration_seconds", sa.Float(), nullable=True),
+        sa.Column("format", sa.String(), nullable=False),
+        sa.Column("uploaded_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("idx_videos_uploaded_id", "videos", ["uploaded_at", "id"])
+
+    op.create_table(
+        "video_frames",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("video_id", sa.String(), sa.ForeignKey("videos.id"), nullable=False, index=True),
+        sa.Column("frame_index", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.Float(), nullable=False, index=True),
+        sa.Column("embedding", Vector(512), nullable=False),
+        sa.Column("scene_description", sa.String(), nullable=True),
+    )
+    op.create_index(
+        "idx_video_frames_embedding_hnsw",
+        "video_frames",
+        ["embedding"],
+        postgresql_using="hnsw",
+        postgresql_ops={"embedding": "vector_cosine_ops"},
+    )
+
+    op.create_table(
+        "processing_jobs",
+        sa.Column("id", sa.String(), primary_key=True, index=True),
+        sa.Column(
+            "video_id",
+            sa.String(),
+            sa.ForeignKey("videos.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        ),
+        sa.Column(
+            "status",
+            sa.Enum("PENDING", "PROCESSING", "COMPLETED", "FAILED", name="jobstatus"),
+            nullable=False,
+            index=True,
+        ),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("error_message", sa.String(), nullable=True),
+        sa.Column("results", sa.JSON(), nullable=True),
+        sa.Column("processing_time_seconds", sa.Float(), nullable=True),
+        sa.Column("frames_processed", sa.Integer(), nullable=True),
+        sa.Column("embeddings_stored", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        "idx_jobs_video_status_created",
+        "processing_jobs",
+        ["video_id", "status", "created_at"],
+    )
+    op.create_index(
+        "idx_jobs_status_created",
+        "processing_jobs",
+        ["status", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("processing_jobs")
+    op.drop_table("video_frames")
+    op.drop_table("videos")
+    op.execute("DROP TYPE IF EXISTS jobstatus")
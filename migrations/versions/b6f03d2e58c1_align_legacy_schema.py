@@ -0,0 +1,94 @@
+"""align pre-alembic (create_all) databases with the current schema
+
+Databases created by the old import-time create_all have an
+ARRAY(Float) embedding column, no ON DELETE CASCADE on
+processing_jobs.video_id and none of the newer indexes. This revision
+detects each gap and fixes it; on a database built fresh by the initial
+revision every check is a no-op.
+
+Revision ID: b6f03d2e58c1
+Revises: 7c1d40a9b3f2
+Create Date: 2026-09-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b6f03d2e58c1"
+down_revision = "7c1d40a9b3f2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ARRAY(Float) -> vector(512); pgvector casts float arrays directly
+    embedding_type = bind.execute(
+        sa.text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'video_frames'::regclass AND attname = 'embedding'"
+        )
+    ).scalar()
+    if embedding_type is not None and not embedding_type.startswith("vector"):
+        op.execute(
+            "ALTER TABLE video_frames "
+            "ALTER COLUMN embedding TYPE vector(512) USING embedding::vector(512)"
+        )
+
+    # processing_jobs.video_id: ensure a single FK with ON DELETE CASCADE
+    job_fks = [
+        fk
+        for fk in inspector.get_foreign_keys("processing_jobs")
+        if fk["constrained_columns"] == ["video_id"]
+    ]
+    needs_fk = not job_fks
+    for fk in job_fks:
+        if (fk.get("options") or {}).get("ondelete") != "CASCADE":
+            op.drop_constraint(fk["name"], "processing_jobs", type_="foreignkey")
+            needs_fk = True
+    if needs_fk:
+        op.create_foreign_key(
+            "processing_jobs_video_id_fkey",
+            "processing_jobs",
+            "videos",
+            ["video_id"],
+            ["id"],
+            ondelete="CASCADE",
+        )
+
+    existing = {
+        idx["name"]
+        for table in ("videos", "video_frames", "processing_jobs")
+        for idx in inspector.get_indexes(table)
+    }
+    if "idx_videos_uploaded_id" not in existing:
+        op.create_index("idx_videos_uploaded_id", "videos", ["uploaded_at", "id"])
+    if "idx_video_frames_embedding_hnsw" not in existing:
+        op.create_index(
+            "idx_video_frames_embedding_hnsw",
+            "video_frames",
+            ["embedding"],
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        )
+    if "idx_jobs_video_status_created" not in existing:
+        op.create_index(
+            "idx_jobs_video_status_created",
+            "processing_jobs",
+            ["video_id", "status", "created_at"],
+        )
+    if "idx_jobs_status_created" not in existing:
+        op.create_index(
+            "idx_jobs_status_created",
+            "processing_jobs",
+            ["status", "created_at"],
+        )
+
+
+def downgrade() -> None:
+    # The legacy shape isn't worth restoring; downgrading past this
+    # revision leaves the aligned schema in place.
+    pass
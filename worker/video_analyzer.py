@@ -1,31 +1,156 @@
 import cv2
+import logging
+import queue
+import threading
 import torch
-from transformers import CLIPProcessor, CLIPModel, CLIPTokenizer
-from PIL import Image
+import torch.nn.functional as F
+from torchvision.transforms import v2 as transforms
+from transformers import CLIPModel, CLIPTokenizerFast
 import numpy as np
 from typing import List, Dict, Any, Tuple
 import tempfile
 import os
 from collections import defaultdict
 
+from app.models import VideoFrame
 
-class VideoAnalyzer:    
+# NVIDIA ModelOpt is optional: when installed and a calibrated checkpoint
+# is provided, the worker restores the quantized (FP8/INT8) encoder
+try:
+    import modelopt.torch.opt as mto
+except ImportError:
+    mto = None
+
+# Normalization constants from the CLIP preprocessor config
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+logger = logging.getLogger('worker.analyzer')
+
+
+class VideoAnalyzer:
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Using device: {self.device}")
-        
+        logger.info("Using device: %s", self.device)
+
         # Load model
         model_name = "openai/clip-vit-base-patch32"
-        self.model = CLIPModel.from_pretrained(model_name)
-        self.processor = CLIPProcessor.from_pretrained(model_name)
-        self.tokenizer = CLIPTokenizer.from_pretrained(model_name)
-        self.model.to(self.device)
+        # SDPA attention dispatches to flash/memory-efficient kernels:
+        # fused softmax and no materialized (seq, seq) attention matrix
+        self.model = CLIPModel.from_pretrained(model_name, attn_implementation="sdpa")
+        # Rust-backed tokenizer: no Python-level BPE on the query path
+        self.tokenizer = CLIPTokenizerFast.from_pretrained(model_name)
+
+        # Post-training quantization: calibration happens offline (FP8 on
+        # Hopper, INT8 elsewhere) and the worker just restores the saved
+        # checkpoint. Skipped unless ModelOpt and the artifact are present.
+        quant_checkpoint = os.getenv("CLIP_QUANT_CHECKPOINT", "")
+        if self.device == "cuda" and mto is not None and os.path.exists(quant_checkpoint):
+            logger.info("Restoring quantized CLIP checkpoint from %s", quant_checkpoint)
+            self.model = mto.restore(self.model, quant_checkpoint)
+
+        # Half precision on GPU: doubles tensor-core throughput and halves
+        # activation bandwidth; bf16 preferred where supported for its
+        # fp32-sized exponent range
+        if self.device == "cuda":
+            self.dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            self.model.to(self.device, dtype=self.dtype)
+        else:
+            self.dtype = torch.float32
+            self.model.to(self.device)
         self.model.eval()
 
+        # Preprocess whole uint8 NCHW batches on the device with fused
+        # torchvision kernels instead of per-image PIL + CLIPProcessor
+        # resizes on the CPU
+        self.preprocess = torch.nn.Sequential(
+            transforms.Resize(224, antialias=True),
+            transforms.CenterCrop(224),
+            transforms.ConvertImageDtype(torch.float32),
+            transforms.Normalize(CLIP_MEAN, CLIP_STD),
+        ).to(self.device)
+
+        # ViT-B/32 trivially fits far more than 8 frames on modern GPUs;
+        # measure instead of guessing (the compiled static shape below
+        # then uses whatever this picks)
+        self.batch_size = self._tune_batch_size() if self.device == "cuda" else 8
+        logger.info("Using batch size: %d", self.batch_size)
+
+        # Frames never change for a given video, so repeated searches can
+        # reuse the vision pass; small FIFO keyed by caller-provided id
+        self._EMB_CACHE_SIZE = 4
+        self._embedding_cache: Dict[str, torch.Tensor] = {}
+
+        # Compile the image encoder for the one (batch, 3, 224, 224) shape
+        # it will ever see; short batches are padded up so CUDA graph
+        # capture never re-triggers. Inductor's graph cache persists the
+        # compiled kernels across worker restarts.
+        self._encode_images = self.model.get_image_features
+        if self.device == "cuda":
+            os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+            os.environ.setdefault(
+                "TORCHINDUCTOR_CACHE_DIR",
+                os.path.join(tempfile.gettempdir(), "torchinductor-worker"),
+            )
+            self._encode_images = torch.compile(
+                self.model.get_image_features, mode="reduce-overhead", fullgraph=True
+            )
+            logger.info("Warming up compiled CLIP image encoder...")
+            warmup = torch.zeros(
+                (self.batch_size, 3, 224, 224), device=self.device, dtype=torch.float32
+            )
+            with torch.no_grad(), self._autocast():
+                self._encode_images(pixel_values=warmup)
+            logger.info("Warmup complete")
+
     
-    def extract_frames(self, video_path: str, sample_rate: int = 30) -> Tuple[List[np.ndarray], Dict]:
+    def _tune_batch_size(self, candidates=(8, 32, 64, 128, 256)) -> int:
+        """
+        Sweep candidate batch sizes on dummy inputs and return the
+        smallest one within 5% of the best measured per-frame throughput,
+        keeping at least 1 GB of VRAM headroom.
+        """
+        ms_per_frame = {}
+        for bs in candidates:
+            try:
+                dummy = torch.zeros((bs, 3, 224, 224), device=self.device)
+                with torch.no_grad(), self._autocast():
+                    self.model.get_image_features(pixel_values=dummy)  # warmup
+                    torch.cuda.synchronize()
+                    start = torch.cuda.Event(enable_timing=True)
+                    end = torch.cuda.Event(enable_timing=True)
+                    start.record()
+                    for _ in range(3):
+                        self.model.get_image_features(pixel_values=dummy)
+                    end.record()
+                    torch.cuda.synchronize()
+                del dummy
+                if torch.cuda.mem_get_info()[0] < 1 << 30:
+                    break
+                ms_per_frame[bs] = start.elapsed_time(end) / (3 * bs)
+            except torch.cuda.OutOfMemoryError:
+                torch.cuda.empty_cache()
+                break
+
+        if not ms_per_frame:
+            return 8
+        best = min(ms_per_frame.values())
+        return next(bs for bs in candidates
+                    if bs in ms_per_frame and ms_per_frame[bs] <= best * 1.05)
+
+    def _autocast(self):
+        """Autocast context for the model's compute dtype (no-op on CPU)."""
+        return torch.autocast(
+            device_type=self.device, dtype=self.dtype, enabled=self.device == "cuda"
+        )
+
+    def extract_frames(self, video_path: str, sample_rate: int = 30) -> Tuple[np.ndarray, Dict]:
         """Extract frames from video at specified sample rate"""
-        frames = []
+        # Sampled frames land in one preallocated (N, H, W, 3) uint8 buffer
+        # with cvtColor writing RGB straight into its rows: no per-frame
+        # allocation and no later stacking copy
+        buf = None
+        sampled = 0
         timestamps = []
         cap = cv2.VideoCapture(video_path)
         
@@ -37,96 +162,370 @@ class VideoAnalyzer:
         fps = cap.get(cv2.CAP_PROP_FPS)
         duration = total_frames / fps if fps > 0 else 0
         
-        print(f"Processing video: {total_frames} frames, {fps:.2f} FPS, {duration:.2f}s")
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if frame_count % sample_rate == 0:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frames.append(frame_rgb)
-                timestamps.append(frame_count / fps if fps > 0 else frame_count)
-            
-            frame_count += 1
-        
+        logger.info("Processing video: %d frames, %.2f FPS, %.2fs", total_frames, fps, duration)
+
+        # Seek straight to each sample point: decoding every frame only to
+        # discard sample_rate-1 of them costs sample_rate times the pixel
+        # bandwidth actually needed. Falls back to a sequential scan when
+        # the container reports no frame count or a seek fails mid-file.
+        def _store(frame, timestamp):
+            nonlocal buf, sampled
+            if buf is None:
+                estimate = total_frames // sample_rate + 1 if total_frames > 0 else 256
+                buf = np.empty((estimate,) + frame.shape, dtype=np.uint8)
+            elif sampled == len(buf):
+                buf = np.concatenate([buf, np.empty_like(buf)])
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buf[sampled])
+            timestamps.append(timestamp)
+            sampled += 1
+
+        seek_ok = total_frames > 0 and sample_rate > 1
+        if seek_ok:
+            for target in range(0, total_frames, sample_rate):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                _store(frame, target / fps if fps > 0 else target)
+            else:
+                target = total_frames
+            seek_ok = target + sample_rate >= total_frames
+
+        if not seek_ok:
+            logger.info("Seek-based sampling unavailable; decoding sequentially")
+            buf = None
+            sampled = 0
+            timestamps.clear()
+            cap.release()
+            cap = cv2.VideoCapture(video_path)
+
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                _store(frame, frame_count / fps if fps > 0 else frame_count)
+
+                # Skip ahead with grab(): it demuxes without the color
+                # conversion, so discarded frames cost a fraction of read()
+                skipped = 0
+                while skipped < sample_rate - 1 and cap.grab():
+                    skipped += 1
+                frame_count += skipped + 1
+                if skipped < sample_rate - 1:
+                    break
+
         cap.release()
-        
+
+        frames = buf[:sampled] if buf is not None else np.empty((0, 0, 0, 3), dtype=np.uint8)
+
         video_info = {
             "total_frames": total_frames,
             "fps": fps,
             "duration": duration,
-            "sampled_frames": len(frames),
+            "sampled_frames": sampled,
             "timestamps": timestamps
         }
-        
-        print(f"Extracted {len(frames)} frames from {total_frames} total frames")
+
+        logger.info("Extracted %d frames from %d total frames", sampled, total_frames)
         return frames, video_info
     
-    def generate_frame_embeddings(self, frames: List[np.ndarray]) -> np.ndarray:
-        """Generate CLIP embeddings for frames"""
+    def _embed_batch(self, batch_frames) -> torch.Tensor:
+        """Embed one batch of RGB frames; returns raw fp32 device rows."""
+        # One stacked HWC uint8 tensor per batch; preprocessing runs on
+        # the device in NCHW layout. A (B, H, W, 3) array from the
+        # preallocated decode buffers is viewed zero-copy.
+        if not isinstance(batch_frames, np.ndarray):
+            batch_frames = np.stack(batch_frames)
+        batch = torch.from_numpy(batch_frames)
+        batch = batch.to(self.device, non_blocking=True).permute(0, 3, 1, 2)
+
+        # Pad short batches to the compiled static shape; padded rows
+        # are sliced off after the forward
+        n = batch.shape[0]
+        if n < self.batch_size and self.device == "cuda":
+            batch = torch.cat(
+                [batch, batch.new_zeros((self.batch_size - n,) + batch.shape[1:])]
+            )
+
+        with torch.no_grad(), self._autocast():
+            pixel_values = self.preprocess(batch)
+            image_features = self._encode_images(pixel_values=pixel_values)
+
+        return image_features[:n].float()
+
+    def generate_frame_embeddings(self, frames: List[np.ndarray], return_tensor: bool = False):
+        """
+        Generate CLIP embeddings for frames.
+
+        Returns a NumPy array by default; with return_tensor=True the
+        normalized matrix stays on the device so callers can keep
+        computing on it without a PCIe round trip.
+        """
+        # Batches are written into one preallocated device tensor: no
+        # per-batch host copies and no final vstack pass, and the L2
+        # normalization runs once over the whole matrix (in fp32, where
+        # the norm reduction can't underflow)
+        out = torch.empty((len(frames), 512), device=self.device, dtype=torch.float32)
+        for i in range(0, len(frames), self.batch_size):
+            features = self._embed_batch(frames[i:i + self.batch_size])
+            out[i:i + features.shape[0]] = features
+
+        out = F.normalize(out, dim=-1)
+        return out if return_tensor else out.cpu().numpy()
+
+    def _iter_frame_batches(self, video_path: str, sample_rate: int, batch_size: int):
+        """
+        Yield (frames, timestamps) batches of sampled RGB frames.
+
+        Probes whether the container seeks reliably and then uses the same
+        seek-or-sequential strategy as extract_frames, but streams batches
+        out as they decode instead of materializing the whole video.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        try:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+
+            use_seek = total_frames > sample_rate > 1
+            if use_seek:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, sample_rate)
+                use_seek = cap.read()[0]
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+            # Each batch gets its own (B, H, W, 3) buffer (the consumer
+            # thread may still hold the previous one) and cvtColor writes
+            # RGB directly into its rows
+            buf = None
+            filled = 0
+            timestamps = []
+
+            def _store(frame, timestamp):
+                nonlocal buf, filled
+                if buf is None:
+                    buf = np.empty((batch_size,) + frame.shape, dtype=np.uint8)
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buf[filled])
+                timestamps.append(timestamp)
+                filled += 1
+
+            if use_seek:
+                for target in range(0, total_frames, sample_rate):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    _store(frame, target / fps if fps > 0 else target)
+                    if filled == batch_size:
+                        yield buf, timestamps
+                        buf, filled, timestamps = None, 0, []
+            else:
+                frame_count = 0
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    _store(frame, frame_count / fps if fps > 0 else frame_count)
+                    if filled == batch_size:
+                        yield buf, timestamps
+                        buf, filled, timestamps = None, 0, []
+
+                    # grab() skips without decoding to BGR
+                    skipped = 0
+                    while skipped < sample_rate - 1 and cap.grab():
+                        skipped += 1
+                    frame_count += skipped + 1
+                    if skipped < sample_rate - 1:
+                        break
+
+            if filled:
+                yield buf[:filled], timestamps
+        finally:
+            cap.release()
+
+    def analyze_video(self, video_path: str, sample_rate: int = 30) -> Tuple[np.ndarray, Dict]:
+        """
+        Decode and embed a video with decode/inference overlap.
+
+        A producer thread feeds sampled-frame batches through a bounded
+        queue while the consumer runs CLIP on them, so batch N is embedded
+        while batch N+1 decodes: wall time is max(decode, inference)
+        instead of their sum. Returns (embeddings, video_info) with
+        video_info shaped like extract_frames'.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        duration = total_frames / fps if fps > 0 else 0
+        cap.release()
+
+        logger.info("Processing video: %d frames, %.2f FPS, %.2fs", total_frames, fps, duration)
+
+        # Bounded queue caps decoded frames held in RAM to 4 batches
+        batches: queue.Queue = queue.Queue(maxsize=4)
+
+        def _producer():
+            try:
+                for item in self._iter_frame_batches(video_path, sample_rate, self.batch_size):
+                    batches.put(item)
+                batches.put(None)
+            except BaseException as e:
+                batches.put(e)
+
+        threading.Thread(target=_producer, daemon=True).start()
+
         embeddings = []
-        batch_size = 8
-        
-        for i in range(0, len(frames), batch_size):
-            batch_frames = frames[i:i + batch_size]
-            pil_images = [Image.fromarray(frame) for frame in batch_frames]
-            
-            inputs = self.processor(images=pil_images, return_tensors="pt", padding=True)
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            with torch.no_grad():
-                image_features = self.model.get_image_features(**inputs)
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-            
-            embeddings.append(image_features.cpu().numpy())
-        
-        return np.vstack(embeddings)
+        timestamps = []
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            batch_frames, batch_timestamps = item
+            embeddings.append(self._embed_batch(batch_frames))
+            timestamps.extend(batch_timestamps)
+
+        video_info = {
+            "total_frames": total_frames,
+            "fps": fps,
+            "duration": duration,
+            "sampled_frames": len(timestamps),
+            "timestamps": timestamps,
+        }
+        logger.info("Embedded %d frames from %d total frames", len(timestamps), total_frames)
+
+        if not embeddings:
+            return np.empty((0, 512), dtype=np.float32), video_info
+        # Batches stay on device until this single normalize + transfer
+        return F.normalize(torch.cat(embeddings), dim=-1).cpu().numpy(), video_info
     
     
+    def _encode_texts(self, queries: List[str]) -> torch.Tensor:
+        """Encode queries into a normalized (Q, 512) fp32 device tensor."""
+        text_inputs = self.tokenizer(queries, padding=True, return_tensors="pt")
+        text_inputs = {k: v.to(self.device) for k, v in text_inputs.items()}
+
+        with torch.no_grad(), self._autocast():
+            text_features = self.model.get_text_features(**text_inputs)
+        text_features = text_features.float()
+        return text_features / text_features.norm(dim=-1, keepdim=True)
+
+    def semantic_search_db(
+        self,
+        db,
+        video_id: str,
+        query: str,
+        threshold: float = 0.25,
+        top_k: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Find frames matching a text query via the pgvector HNSW index.
+
+        Only the text embedding is computed here; cosine similarity runs
+        inside Postgres over the stored video_frames rows, so no frame or
+        embedding ever has to be resident in worker memory. Use
+        semantic_search for frames that haven't been committed yet.
+        """
+        logger.info("Searching video %s in Postgres for: '%s'", video_id, query)
+
+        query_embedding = self._encode_texts([query])[0].cpu().numpy()
+
+        distance = VideoFrame.embedding.cosine_distance(query_embedding.tolist())
+        rows = (
+            db.query(
+                VideoFrame.frame_index,
+                VideoFrame.timestamp,
+                (1 - distance).label("score"),
+            )
+            .filter(VideoFrame.video_id == video_id)
+            .order_by(distance)
+            .limit(top_k)
+            .all()
+        )
+
+        matches = [
+            {
+                "frame_index": r.frame_index,
+                "timestamp": float(r.timestamp),
+                "similarity_score": float(r.score),
+                "time_formatted": f"{int(r.timestamp // 60)}:{int(r.timestamp % 60):02d}",
+            }
+            for r in rows
+            if r.score > threshold
+        ]
+
+        logger.info("Found %d matching frames", len(matches))
+        return matches
+
     def semantic_search(
         self,
         frames: List[np.ndarray],
         timestamps: List[float],
-        query: str,
-        threshold: float = 0.25
-    ) -> List[Dict[str, Any]]:
+        query,
+        threshold: float = 0.25,
+        cache_key: str = None,
+    ):
         """
-        Find frames matching a text query
+        Find frames matching one or more text queries
         Example: "a person holding a phone", "people in a meeting"
+
+        Accepts a single query string (returns one match list) or a list
+        of queries (returns one match list per query); all queries share
+        a single text-encoder forward and one similarity matmul. Passing
+        cache_key (e.g. the video id or path) reuses the frame embeddings
+        from an earlier search over the same frames, skipping the
+        compute-bound vision pass entirely.
         """
-        print(f"Searching for: '{query}'")
-        
-        # Generate text embedding for query
-        text_inputs = self.tokenizer([query], padding=True, return_tensors="pt")
-        text_inputs = {k: v.to(self.device) for k, v in text_inputs.items()}
-        
-        with torch.no_grad():
-            text_features = self.model.get_text_features(**text_inputs)
-            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-        
-        # Generate image embeddings
-        image_embeddings = self.generate_frame_embeddings(frames)
-        image_embeddings_tensor = torch.from_numpy(image_embeddings).to(self.device)
-        
-        # Calculate similarity
-        similarity = (image_embeddings_tensor @ text_features.T).squeeze().cpu().numpy()
-        
-        # Find matching frames above threshold
-        matches = []
-        for i, score in enumerate(similarity):
-            if score > threshold:
-                matches.append({
-                    "frame_index": i,
-                    "timestamp": timestamps[i],
+        queries = [query] if isinstance(query, str) else list(query)
+        logger.info("Searching for: %s", queries)
+
+        text_features = self._encode_texts(queries)
+
+        # Image embeddings stay on device: the similarity matmul and the
+        # threshold filter run there, and only the matching scores cross
+        # back to the host
+        image_embeddings = self._embedding_cache.get(cache_key) if cache_key else None
+        if image_embeddings is None:
+            image_embeddings = self.generate_frame_embeddings(frames, return_tensor=True)
+            if cache_key:
+                if len(self._embedding_cache) >= self._EMB_CACHE_SIZE:
+                    self._embedding_cache.pop(next(iter(self._embedding_cache)))
+                self._embedding_cache[cache_key] = image_embeddings
+
+        similarity = image_embeddings @ text_features.T  # (N, Q)
+
+        frame_idx, query_idx = (similarity > threshold).nonzero(as_tuple=True)
+        scores = similarity[frame_idx, query_idx].cpu().numpy()
+        frame_idx = frame_idx.cpu().numpy()
+        query_idx = query_idx.cpu().numpy()
+
+        # Vectorized post-processing: per-query argsort on the score
+        # vector and two divmod ops for all the mm:ss strings, instead of
+        # a Python loop with per-frame float arithmetic
+        timestamps_arr = np.asarray(timestamps, dtype=np.float64)
+
+        per_query = []
+        for q in range(len(queries)):
+            sel = query_idx == q
+            order = np.argsort(-scores[sel])
+            q_idx = frame_idx[sel][order]
+            q_scores = scores[sel][order]
+            q_ts = timestamps_arr[q_idx]
+            mins, secs = np.divmod(q_ts.astype(np.int64), 60)
+            per_query.append([
+                {
+                    "frame_index": int(i),
+                    "timestamp": float(t),
                     "similarity_score": float(score),
-                    "time_formatted": f"{int(timestamps[i] // 60)}:{int(timestamps[i] % 60):02d}"
-                })
-        
-        # Sort by similarity
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-        
-        print(f"Found {len(matches)} matching frames")
-        return matches
+                    "time_formatted": f"{m}:{s:02d}",
+                }
+                for i, t, score, m, s in zip(q_idx, q_ts, q_scores, mins, secs)
+            ])
+
+        logger.info("Found %d matching frames", sum(len(m) for m in per_query))
+        return per_query[0] if isinstance(query, str) else per_query
     
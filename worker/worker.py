@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 import json
+import logging
 import time
 import boto3
 import os
 import tempfile
+import threading
 import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, func, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import sessionmaker
 
 from worker.video_analyzer import VideoAnalyzer
@@ -17,21 +21,30 @@ from app.pinecone_client import upsert_embeddings
 
 settings = get_settings()
 
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    format='%(asctime)s %(levelname)s %(name)s %(message)s',
+)
+logger = logging.getLogger('worker')
+
 # Graceful shutdown handler
 shutdown_flag = False
 def signal_handler(signum, frame):
     global shutdown_flag
-    print(f"\nReceived signal {signum}. Initiating graceful shutdown...")
+    logger.info("Received signal %s. Initiating graceful shutdown...", signum)
     shutdown_flag = True
 
 signal.signal(signal.SIGTERM, signal_handler)
 signal.signal(signal.SIGINT, signal_handler)
 
 # Configuration
-MAX_MESSAGES = int(os.getenv('MAX_MESSAGES_PER_BATCH', '1'))
+MAX_MESSAGES = int(os.getenv('MAX_MESSAGES_PER_BATCH', '10'))
 WAIT_TIME_SECONDS = int(os.getenv('SQS_WAIT_TIME', '20'))
 VISIBILITY_TIMEOUT = int(os.getenv('VISIBILITY_TIMEOUT', '900'))  # 15 minutes
 POLL_INTERVAL = int(os.getenv('POLL_INTERVAL', '10'))
+# Decode straight from S3 over a presigned URL (no local copy); OpenCV's
+# FFmpeg backend handles range requests, so seeking still works
+STREAM_S3_VIDEOS = os.getenv('STREAM_S3_VIDEOS', 'true').lower() == 'true'
 
 s3_client = boto3.client('s3', region_name=settings.aws_region)
 sqs_client = boto3.client('sqs', region_name=settings.aws_region)
@@ -40,9 +53,70 @@ sqs_client = boto3.client('sqs', region_name=settings.aws_region)
 engine = create_engine(settings.database_url, pool_pre_ping=True, pool_size=5, max_overflow=10)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-print("Initializing CLIP model...")
+logger.info("Initializing CLIP model...")
 analyzer = VideoAnalyzer()
-print("CLIP model loaded successfully")
+logger.info("CLIP model loaded successfully")
+
+# Downloads for the next messages run here while the GPU processes the
+# current one, so inference never waits on S3
+download_pool = ThreadPoolExecutor(max_workers=2)
+
+
+def download_video(message):
+    """Download a message's video from S3 to a temp file; returns the path."""
+    body = json.loads(message['Body'])
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
+        tmp_path = tmp_file.name
+    s3_client.download_file(body['s3_bucket'], body['s3_key'], tmp_path)
+    return tmp_path
+
+
+def start_visibility_heartbeat(receipt_handle):
+    """
+    Keep extending the message's visibility while it is being processed.
+
+    With up to 10 messages fetched per receive, the later ones can sit
+    longer than VISIBILITY_TIMEOUT before their turn; the heartbeat stops
+    them from reappearing in the queue mid-flight. Returns an Event that
+    the caller sets when processing finishes.
+    """
+    stop = threading.Event()
+
+    def _beat():
+        while not stop.wait(VISIBILITY_TIMEOUT / 3):
+            try:
+                sqs_client.change_message_visibility(
+                    QueueUrl=settings.sqs_queue_url,
+                    ReceiptHandle=receipt_handle,
+                    VisibilityTimeout=VISIBILITY_TIMEOUT
+                )
+            except Exception as e:
+                logger.warning("Visibility heartbeat failed: %s", e)
+                return
+
+    threading.Thread(target=_beat, daemon=True).start()
+    return stop
+
+
+def ensure_job_row(db, job_id: str, video_id: str):
+    """
+    Create the processing_jobs row for a received message if it doesn't
+    exist yet.
+
+    The upload path no longer inserts the job; the SQS message is the
+    source of truth and this idempotent insert materializes it. Redeliveries
+    and jobs pre-created via the jobs API hit the ON CONFLICT no-op.
+    """
+    try:
+        db.execute(
+            pg_insert(ProcessingJob)
+            .values(id=job_id, video_id=video_id, status=JobStatus.PENDING)
+            .on_conflict_do_nothing(index_elements=['id'])
+        )
+        db.commit()
+    except Exception as e:
+        logger.error("Error creating job row for %s: %s", job_id, e)
+        db.rollback()
 
 
 def update_job_status(db, job_id: str, status: JobStatus, **kwargs):
@@ -52,30 +126,64 @@ def update_job_status(db, job_id: str, status: JobStatus, **kwargs):
             job.status = status
             for key, value in kwargs.items():
                 setattr(job, key, value)
+            # No refresh round trip: nothing reads the job back afterwards
             db.commit()
-            db.refresh(job)
-            return job
         else:
-            print(f"Warning: Job {job_id} not found in database")
-            return None
+            logger.warning("Job %s not found in database", job_id)
     except Exception as e:
-        print(f"Error updating job status: {e}")
+        logger.error("Error updating job status: %s", e)
         db.rollback()
-        return None
 
 
-def store_frame_embeddings(video_id: str, video_filename: str, frames_data: list, embeddings_array):
+def store_frame_embeddings(db, video_id: str, video_filename: str, frames_data: list,
+                           embeddings_array, duration: float = None):
     """
-    Store frame embeddings in Pinecone
-    
+    Store frame embeddings in Postgres (pgvector) and Pinecone
+
     Args:
+        db: database session
         video_id: ID of the video
         video_filename: Name of the video file
         frames_data: List of dicts with frame_index and timestamp
         embeddings_array: numpy array of embeddings (n_frames, 512)
+        duration: video duration, stored if the video doesn't have one yet
     """
-    print(f"Storing {len(frames_data)} embeddings to Pinecone...")
-    
+    # One multi-row statement for all frames; reprocessing the same video
+    # updates in place via the (video_id, frame_index) conflict target
+    # instead of erroring or duplicating rows. The duration backfill rides
+    # in the same transaction as a COALESCE update, replacing the old
+    # SELECT-then-conditional-commit pair.
+    rows = [
+        {
+            'video_id': video_id,
+            'frame_index': frame_info['frame_index'],
+            'timestamp': float(frame_info['timestamp']),
+            'embedding': embeddings_array[i],
+        }
+        for i, frame_info in enumerate(frames_data)
+    ]
+    try:
+        if rows:
+            stmt = pg_insert(VideoFrame).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                constraint='uq_video_frames_video_frame',
+                set_={'timestamp': stmt.excluded.timestamp, 'embedding': stmt.excluded.embedding},
+            )
+            db.execute(stmt)
+        if duration is not None:
+            db.execute(
+                update(Video)
+                .where(Video.id == video_id)
+                .values(duration_seconds=func.coalesce(Video.duration_seconds, duration))
+            )
+        db.commit()
+        logger.info("Stored %d embeddings in Postgres", len(rows))
+    except Exception as e:
+        logger.error("Error storing embeddings in Postgres: %s", e)
+        db.rollback()
+
+    logger.info("Storing %d embeddings to Pinecone...", len(frames_data))
+
     frame_embeddings = []
     for i, frame_info in enumerate(frames_data):
         frame_id = f"{video_id}_frame_{i}"
@@ -94,25 +202,25 @@ def store_frame_embeddings(video_id: str, video_filename: str, frames_data: list
     # Upsert to Pinecone
     result = upsert_embeddings(video_id, frame_embeddings)
     
-    print(f"Stored {result['upserted_count']} embeddings in Pinecone")
+    logger.info("Stored %d embeddings in Pinecone", result['upserted_count'])
     return result['upserted_count']
 
 
-def process_message(message, db):
+def process_message(message, db, download):
     start_time = time.time()
     receipt_handle = message['ReceiptHandle']
-    
+
     try:
         body = json.loads(message['Body'])
         job_id = body['job_id']
         video_id = body['video_id']
         s3_key = body['s3_key']
         s3_bucket = body['s3_bucket']
-        
-        print(f"Processing job: {job_id}")
-        print(f"Video ID: {video_id}")
-        print(f"S3 Location: s3://{s3_bucket}/{s3_key}")
-        
+
+        logger.info("Processing job=%s video=%s s3=s3://%s/%s",
+                    job_id, video_id, s3_bucket, s3_key)
+
+        ensure_job_row(db, job_id, video_id)
         update_job_status(
             db, job_id,
             status=JobStatus.PROCESSING,
@@ -121,42 +229,62 @@ def process_message(message, db):
         video = db.query(Video).filter(Video.id == video_id).first()
         if not video:
             raise Exception(f"Video {video_id} not found in database")
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-            tmp_path = tmp_file.name
-            print(f"Downloading from S3")
-            
+
+        tmp_path = None
+        if download is not None:
+            # The download was kicked off when the batch arrived and has
+            # been running alongside the previous message's GPU work
             try:
-                s3_client.download_file(s3_bucket, s3_key, tmp_path)
+                tmp_path = download.result()
                 file_size = os.path.getsize(tmp_path)
-                print(f"Downloaded {file_size / (1024*1024):.2f} MB to {tmp_path}")
+                logger.info("Downloaded %.2f MB to %s", file_size / (1024*1024), tmp_path)
             except Exception as e:
-                print(f"S3 download failed: {e}")
+                logger.error("S3 download failed: %s", e)
                 raise
-        
-        print(f"Analyzing video with model")        
-        frames, video_info = analyzer.extract_frames(tmp_path, sample_rate=30)
-        embeddings = analyzer.generate_frame_embeddings(frames)
+            source = tmp_path
+        else:
+            # Decode begins as soon as the first bytes arrive and the
+            # video body never touches local disk
+            logger.info("Streaming from S3 (no local download)")
+            source = s3_client.generate_presigned_url(
+                ClientMethod='get_object',
+                Params={'Bucket': s3_bucket, 'Key': s3_key},
+                ExpiresIn=VISIBILITY_TIMEOUT * 2
+            )
+
+        logger.info("Analyzing video with model")
+        # Decode and inference overlap inside analyze_video
+        try:
+            embeddings, video_info = analyzer.analyze_video(source, sample_rate=30)
+        except ValueError:
+            if tmp_path is not None:
+                raise
+            # Some codecs/containers don't decode well over HTTP; retry
+            # against a local copy
+            logger.warning("Streaming decode failed; falling back to local download")
+            tmp_path = download_video(message)
+            embeddings, video_info = analyzer.analyze_video(tmp_path, sample_rate=30)
+        frames_processed = video_info['sampled_frames']
         frames_data = [
             {
                 'frame_index': i,
                 'timestamp': video_info['timestamps'][i]
             }
-            for i in range(len(frames))
+            for i in range(frames_processed)
         ]
         
         embeddings_count = store_frame_embeddings(
-            video_id, 
+            db,
+            video_id,
             video.filename,
-            frames_data, 
-            embeddings
+            frames_data,
+            embeddings,
+            duration=video_info['duration']
         )
-        
-        if video and video.duration_seconds is None:
-            video.duration_seconds = video_info['duration']
-            db.commit()
 
-        os.unlink(tmp_path)
-        print(f"Cleaned up temporary file")
+        if tmp_path is not None:
+            os.unlink(tmp_path)
+            logger.debug("Cleaned up temporary file")
         
         processing_time = time.time() - start_time
         
@@ -166,25 +294,23 @@ def process_message(message, db):
             completed_at=datetime.utcnow(),
             results={},#results,
             processing_time_seconds=processing_time,
-            frames_processed=len(frames),
+            frames_processed=frames_processed,
             embeddings_stored=embeddings_count
         )
 
-        print(f"Job {job_id} completed successfully")
-        print(f"Processing time: {processing_time:.2f}s")
-        print(f"Frames processed: {len(frames)}")
-        print(f"Embeddings stored: {embeddings_count}")
+        logger.info("Job %s completed in %.2fs: frames=%d embeddings=%d",
+                    job_id, processing_time, frames_processed, embeddings_count)
         
         sqs_client.delete_message(
             QueueUrl=settings.sqs_queue_url,
             ReceiptHandle=receipt_handle
         )
-        print(f"Message deleted from queue\n")
+        logger.debug("Message deleted from queue")
         
         return True
         
     except Exception as e:
-        print(f"Error processing message: {str(e)}")
+        logger.error("Error processing message: %s", e)
         
         try:
             body = json.loads(message['Body'])
@@ -197,7 +323,7 @@ def process_message(message, db):
                     error_message=str(e)
                 )
         except Exception as update_error:
-            print(f"Failed to update job status: {update_error}")
+            logger.error("Failed to update job status: %s", update_error)
         
         return False
 
@@ -217,24 +343,22 @@ def health_check():
         
         return True
     except Exception as e:
-        print(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         return False
 
 
 def main():
-    print(f"Worker started")
-    print(f"Queue URL: {settings.sqs_queue_url}")
-    print(f"Database: {settings.database_url.split('@')[1] if '@' in settings.database_url else 'configured'}")
-    print(f"S3 Bucket: {settings.s3_bucket_name}")
-    print(f"Max Messages per Batch: {MAX_MESSAGES}")
-    print(f"Wait Time: {WAIT_TIME_SECONDS}s")
-    print(f"Visibility Timeout: {VISIBILITY_TIMEOUT}s")
+    logger.info("Worker started: queue=%s bucket=%s", settings.sqs_queue_url, settings.s3_bucket_name)
+    logger.info("Database: %s",
+                settings.database_url.split('@')[1] if '@' in settings.database_url else 'configured')
+    logger.info("Max messages per batch=%d wait=%ds visibility=%ds",
+                MAX_MESSAGES, WAIT_TIME_SECONDS, VISIBILITY_TIMEOUT)
     
     if not health_check():
-        print("Initial health check failed. Exiting...")
+        logger.error("Initial health check failed. Exiting...")
         sys.exit(1)
     
-    print("Health check passed. Starting to poll for messages\n")
+    logger.info("Health check passed. Starting to poll for messages")
     
     consecutive_errors = 0
     max_consecutive_errors = 10
@@ -242,8 +366,6 @@ def main():
     while not shutdown_flag:
         db = None
         try:
-            db = SessionLocal()
-            
             response = sqs_client.receive_message(
                 QueueUrl=settings.sqs_queue_url,
                 MaxNumberOfMessages=MAX_MESSAGES,
@@ -256,33 +378,64 @@ def main():
             messages = response.get('Messages', [])
             
             if messages:
-                print(f"Received {len(messages)} message(s) from queue")
+                logger.info("Received %d message(s) from queue", len(messages))
                 consecutive_errors = 0
-                
+
+                # A session only exists while there are jobs to run; idle
+                # polling doesn't check a connection out of the pool
+                db = SessionLocal()
+
+                # Start every download immediately; the pool overlaps them
+                # with GPU processing of earlier messages. In streaming
+                # mode nothing is prefetched -- decode reads S3 directly.
+                downloads = {}
+                if not STREAM_S3_VIDEOS:
+                    downloads = {
+                        message['MessageId']: download_pool.submit(download_video, message)
+                        for message in messages
+                    }
+
                 for message in messages:
                     if shutdown_flag:
-                        print("Shutdown flag set, stopping message processing")
+                        logger.info("Shutdown flag set, stopping message processing")
                         break
-                    
-                    success = process_message(message, db)
+
+                    heartbeat_stop = start_visibility_heartbeat(message['ReceiptHandle'])
+                    try:
+                        success = process_message(
+                            message, db, downloads.get(message['MessageId'])
+                        )
+                    finally:
+                        heartbeat_stop.set()
                     if not success:
                         consecutive_errors += 1
-                    
+
+                else:
+                    downloads = None
+
+                # Drained early (shutdown): remove any prefetched files
+                if downloads:
+                    for future in downloads.values():
+                        try:
+                            os.unlink(future.result())
+                        except Exception:
+                            pass
+
             else:
-                print(f"[{datetime.utcnow().strftime('%H:%M:%S')}] No messages. Waiting...")
+                logger.debug("No messages. Waiting...")
                 time.sleep(POLL_INTERVAL)
                 
         except KeyboardInterrupt:
-            print("\nInterrupt received. Shutting down...")
+            logger.info("Interrupt received. Shutting down...")
             break
             
         except Exception as e:
             consecutive_errors += 1
-            print(f"\nError: {e}")
-            print(f"Consecutive errors: {consecutive_errors}/{max_consecutive_errors}\n")
+            logger.error("Error: %s (consecutive errors %d/%d)",
+                         e, consecutive_errors, max_consecutive_errors)
             
             if consecutive_errors >= max_consecutive_errors:
-                print(f"Max consecutive errors reached. Exiting...")
+                logger.error("Max consecutive errors reached. Exiting...")
                 sys.exit(1)
             
             time.sleep(POLL_INTERVAL)
@@ -291,7 +444,7 @@ def main():
             if db:
                 db.close()
     
-    print("Graceful shutdown complete")
+    logger.info("Graceful shutdown complete")
     sys.exit(0)
 
 